@@ -2,21 +2,26 @@ import os
 import platform
 import struct
 import sys
-from contextlib import ExitStack, contextmanager
+import threading
+from contextlib import ExitStack
 from ctypes import (CDLL, CFUNCTYPE, POINTER, Structure, c_bool, c_byte,
                     c_char, c_char_p, c_double, c_float, c_int, c_int8,
                     c_int16, c_int32, c_int64, c_long, c_longdouble,
                     c_longlong, c_short, c_size_t, c_ssize_t, c_ubyte, c_uint,
                     c_uint8, c_uint16, c_uint32, c_uint64, c_ulong,
-                    c_ulonglong, c_ushort, c_void_p, c_wchar, c_wchar_p, cast,
+                    c_ulonglong, c_ushort, c_void_p, c_wchar, c_wchar_p, byref,
                     pointer, sizeof)
 from ctypes.util import find_library
-from functools import wraps
+from functools import lru_cache
 from stat import S_ISREG
-from typing import Any, Callable, Generator, Optional, TypeVar, Union, cast, overload
+from types import SimpleNamespace
+from typing import Any, Callable, Optional, TypeVar, Union, overload
 
 T = TypeVar('T')
 
+DEBUG = os.environ.get('PYNEAPPLE_DEBUG', '').strip().lower() not in ('', '0', 'false', 'no', 'off')
+_STDOUT_IS_REG = DEBUG and S_ISREG(os.fstat(1).st_mode)
+
 
 class _DefaultTag:
     ...
@@ -29,7 +34,7 @@ def debug_log(msg, *, ret: T) -> T: ...
 
 
 def debug_log(msg, *, ret: Any = _DefaultTag):
-    if S_ISREG(os.fstat(1).st_mode):
+    if _STDOUT_IS_REG:
         os.fsync(1)
     if ret is _DefaultTag:
         ret = msg
@@ -42,21 +47,37 @@ def setup_signature(c_fn, restype: Optional[type] = None, *argtypes: type):
     return c_fn
 
 
+@lru_cache(maxsize=None)
+def _proto(restype: Optional[type], argtypes: tuple[type, ...]):
+    return CFUNCTYPE(restype, *argtypes)
+
+
+@lru_cache(maxsize=None)
+def _bound(addr: int, restype: Optional[type], argtypes: tuple[type, ...]) -> Callable:
+    return _proto(restype, argtypes)(addr)
+
+
 def cfn_at(addr: int, restype: Optional[type] = None, *argtypes: type) -> Callable:
-    return CFUNCTYPE(restype, *argtypes)(addr)
+    return _bound(addr, restype, argtypes)
 
 
 def as_fnptr(cb: Callable, restype: Optional[type] = None, *argtypes: type) -> c_void_p:
-    return cast(CFUNCTYPE(restype, *argtypes)(cb), c_void_p)
+    return c_void_p.from_buffer(_proto(restype, argtypes)(cb))
 
 
 class DLError(OSError):
     UNKNOWN_ERROR = b'<unknown error>'
 
-    def __init__(self, fname: bytes, arg: str, err: Optional[bytes]) -> None:
+    def __init__(self, fname: bytes, arg: Union[str, Callable[[], str]], err: Optional[bytes]) -> None:
         self.fname = fname
         self.err = err
-        self.arg = arg
+        self._arg = arg
+
+    @property
+    def arg(self) -> str:
+        if callable(self._arg):
+            self._arg = self._arg()
+        return self._arg
 
     def __str__(self) -> str:
         arg = ''
@@ -69,23 +90,27 @@ class DLError(OSError):
         return f'DLError(fname={self.fname!r}, arg={self.arg!r}, err={self.err!r})'
 
     @staticmethod
-    def handle(ret: Optional[int], fname: bytes, arg: str, err: Optional[bytes]) -> int:
+    def handle(ret: Optional[int], fname: bytes, arg: Union[str, Callable[[], str]], errfn: Callable[[], Optional[bytes]]) -> int:
         if not ret:
-            raise DLError(fname, arg, err)
+            raise DLError(fname, arg, errfn())
         return ret
 
     @staticmethod
-    def wrap(fn, fname: bytes, errfn: Callable[[], Optional[bytes]], *partial, success_handle):
-        return wraps(fn)(lambda *args: success_handle(DLError.handle(fn(*partial, *args), fname, ''.join(map(str, args)), errfn())))
+    def dlopen_errcheck(errfn: Callable[[], Optional[bytes]]):
+        def _check(ret, func, args):
+            if not ret:
+                raise DLError(b'dlopen', lambda: args[0].decode(), errfn())
+            return ret
+        return _check
 
 
-class NotNull_VoidP(c_void_p):
-    def __init__(self, value: int):
-        super().__init__(value)
+NotNull_VoidP = c_void_p
 
-    @property
-    def value(self) -> int:
-        return cast(int, super().value)
+
+def not_null(p: c_void_p, action: Callable[[], str] = lambda: 'get a non-null pointer') -> NotNull_VoidP:
+    if not p.value:
+        raise ValueError(f'Failed to {action()} (got nil)')
+    return p
 
 
 DLSYM_FUNC = Callable[[bytes], NotNull_VoidP]
@@ -97,19 +122,36 @@ def dlsym_factory(ldl_openmode: int = os.RTLD_NOW):
     fn_dlsym = setup_signature(ldl.dlsym, c_void_p, c_void_p, c_char_p)
     fn_dlclose = setup_signature(ldl.dlclose, c_int, c_void_p)
     fn_dlerror = setup_signature(ldl.dlerror, c_char_p)
-
-    @contextmanager
-    def dlsym_factory(path: bytes, mode: int = os.RTLD_LAZY) -> Generator[DLSYM_FUNC, None, None]:
-        h_lib = DLError.handle(
-            fn_dlopen(path, mode),
-            b'dlopen', path.decode(), fn_dlerror())
-        try:
-            yield DLError.wrap(fn_dlsym, b'dlsym', fn_dlerror, c_void_p(h_lib), success_handle=lambda x: c_void_p((lambda x: debug_log(f'dlsym@{x}', ret=x))(x)))
-        finally:
+    fn_dlopen.errcheck = DLError.dlopen_errcheck(fn_dlerror)
+
+    class _DlHandle:
+        __slots__ = ('path', 'mode', 'h_lib')
+
+        def __init__(self, path: bytes, mode: int = os.RTLD_LAZY) -> None:
+            self.path = path
+            self.mode = mode
+
+        def __enter__(self) -> DLSYM_FUNC:
+            h_lib = self.h_lib = fn_dlopen(self.path, self.mode)
+            cache: dict[bytes, int] = {}
+
+            def resolve(name: bytes) -> NotNull_VoidP:
+                addr = cache.get(name)
+                if addr is None:
+                    addr = fn_dlsym(h_lib, name)
+                    if not addr:
+                        raise DLError(b'dlsym', name.decode(), fn_dlerror())
+                    cache[name] = addr
+                    if DEBUG:
+                        debug_log(f'dlsym@{addr}')
+                return c_void_p(addr)
+            return resolve
+
+        def __exit__(self, exc_type, exc_value, traceback) -> None:
             DLError.handle(
-                not fn_dlclose(h_lib),
-                b'dlclose', path.decode(), fn_dlerror())
-    return dlsym_factory
+                not fn_dlclose(self.h_lib),
+                b'dlclose', self.path.decode, fn_dlerror)
+    return _DlHandle
 
 
 class objc_super(Structure):
@@ -125,7 +167,33 @@ Integral = Union[
         type[c_uint32], type[c_uint64], type[c_long], type[c_ulong], type[c_longlong], type[c_ulonglong],
         type[c_size_t], type[c_ssize_t],]
 
+
+_OBJC_SYMS: tuple[tuple[str, Optional[type], tuple[type, ...]], ...] = (
+    ('objc_getClass', c_void_p, (c_char_p,)),
+    ('object_getClass', c_void_p, (c_void_p,)),
+    ('sel_registerName', c_void_p, (c_char_p,)),
+)
+
+_OBJC_LAZY_SYMS: dict[str, tuple[Optional[type], tuple[type, ...]]] = {
+    'class_addProtocol': (c_byte, (c_void_p, c_void_p)),
+    'class_addMethod': (c_byte, (c_void_p, c_void_p, c_void_p, c_char_p)),
+    'class_addIvar': (c_byte, (c_void_p, c_char_p, c_size_t, c_uint8, c_char_p)),
+    'class_conformsToProtocol': (c_byte, (c_void_p, c_void_p)),
+    'class_getMethodImplementation': (c_void_p, (c_void_p, c_void_p)),
+    'class_getName': (c_char_p, (c_void_p,)),
+    'class_getSuperclass': (c_void_p, (c_void_p,)),
+
+    'objc_getProtocol': (c_void_p, (c_char_p,)),
+    'objc_allocateClassPair': (c_void_p, (c_void_p, c_char_p, c_size_t)),
+    'objc_registerClassPair': (None, (c_void_p,)),
+
+    'object_getInstanceVariable': (c_void_p, (c_void_p, c_char_p, POINTER(c_void_p))),
+    'object_setInstanceVariable': (c_void_p, (c_void_p, c_char_p, c_void_p)),
+}
+
+
 class PyNeApple:
+    KNOWN_SELECTORS = (b'alloc', b'init', b'initWithFrame:configuration:')
 
     def __init__(self):
         self._init = False
@@ -134,36 +202,42 @@ class PyNeApple:
         self._stack = ExitStack()
         self.dlsym_of_lib = dlsym_factory()
         self._fwks: dict[str, DLSYM_FUNC] = {}
+        self._sel_cache: dict[bytes, int] = {}
+        self._bound_sels: dict[tuple[bytes, Optional[type], tuple[type, ...]], Callable] = {}
+        self._superclass_cache: dict[int, int] = {}
+        self._super_tls = threading.local()
+        self._class_cache: dict[bytes, int] = {}
+        self._imp_cache: dict[tuple[int, int, Optional[type], tuple[type, ...]], Callable] = {}
+        self._msgsend_cache: dict[tuple[Optional[type], tuple[type, ...], bool], Callable] = {}
         self._init = True
 
         self._objc = self._stack.enter_context(self.dlsym_of_lib(b'/usr/lib/libobjc.A.dylib', os.RTLD_NOW))
         self._system = self._stack.enter_context(self.dlsym_of_lib(b'/usr/lib/libSystem.B.dylib', os.RTLD_LAZY))
         self.p_NSConcreteMallocBlock = self._system(b'_NSConcreteMallocBlock').value
 
-        self.class_addProtocol = cfn_at(self._objc(b'class_addProtocol').value, c_byte, c_void_p, c_void_p)
-        self.class_addMethod = cfn_at(self._objc(b'class_addMethod').value, c_byte, c_void_p, c_void_p, c_void_p, c_char_p)
-        self.class_addIvar = cfn_at(self._objc(b'class_addIvar').value, c_byte, c_void_p, c_char_p, c_size_t, c_uint8, c_char_p)
-        self.class_conformsToProtocol = cfn_at(self._objc(b'class_conformsToProtocol').value, c_byte, c_void_p, c_void_p)
-
-        self.objc_getProtocol = cfn_at(self._objc(b'objc_getProtocol').value, c_void_p, c_char_p)
-        self.objc_allocateClassPair = cfn_at(self._objc(b'objc_allocateClassPair').value, c_void_p, c_void_p, c_char_p, c_size_t)
-        self.objc_registerClassPair = cfn_at(self._objc(b'objc_registerClassPair').value, None, c_void_p)
-        self.objc_getClass = cfn_at(self._objc(b'objc_getClass').value, c_void_p, c_char_p)
+        for name, restype, argtypes in _OBJC_SYMS:
+            setattr(self, name, _bound(self._objc(name.encode()).value, restype, argtypes))
         self.pobjc_msgSend = self._objc(b'objc_msgSend').value
         self.pobjc_msgSendSuper = self._objc(b'objc_msgSendSuper').value
 
-        self.object_getClass = cfn_at(self._objc(b'object_getClass').value, c_void_p, c_void_p)
-        self.object_getInstanceVariable = cfn_at(
-            self._objc(b'object_getInstanceVariable').value, c_void_p,
-            c_void_p, c_char_p, POINTER(c_void_p))
-        self.object_setInstanceVariable = cfn_at(
-            self._objc(b'object_setInstanceVariable').value, c_void_p,
-            c_void_p, c_char_p, c_void_p)
-
-        self.sel_registerName = cfn_at(self._objc(b'sel_registerName').value, c_void_p, c_char_p)
+        for sel_name in PyNeApple.KNOWN_SELECTORS:
+            self._sel_cache[sel_name] = self.sel_registerName(sel_name)
+        self._alloc = self._msgsend(c_void_p, ())
+        self._sel_alloc = self._sel_cache[b'alloc']
         return self
 
+    def __getattr__(self, name: str):
+        sig = _OBJC_LAZY_SYMS.get(name)
+        if sig is None:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+        if not self.__dict__.get('_init'):
+            raise RuntimeError(f'cannot bind {name}: {type(self).__name__} is not entered or has already exited')
+        fn = _bound(self._objc(name.encode()).value, *sig)
+        setattr(self, name, fn)
+        return fn
+
     def __exit__(self, exc_type, exc_value, traceback):
+        self._init = False
         return self._stack.__exit__(exc_type, exc_value, traceback)
 
     def open_dylib(self, path: bytes, mode=os.RTLD_LAZY) -> DLSYM_FUNC:
@@ -203,20 +277,86 @@ class PyNeApple:
     def send_message(self, obj: c_void_p, sel_name: bytes, *, restype: None = None, is_super: bool = False) -> None: ...
 
     def send_message(self, obj: c_void_p, sel_name: bytes, *args, restype: Optional[type] = None, argtypes: tuple[type, ...] = (), is_super: bool = False):
-        sel = c_void_p(self.sel_registerName(sel_name))
+        sel = self.selector(sel_name)
         if is_super:
-            receiver = objc_super(receiver=obj, super_class=c_void_p(self.send_message(self.object_getClass(obj), b'superclass', restype=c_void_p)))
-            cfn_at(self.pobjc_msgSendSuper, restype, objc_super, c_void_p, *argtypes)(receiver, sel, *args)
-        return cfn_at(self.pobjc_msgSend, restype, c_void_p, c_void_p, *argtypes)(obj, sel, *args)
+            cls_addr = self.object_getClass(obj)
+            sup = self._superclass_cache.get(cls_addr)
+            if sup is None:
+                sup = self._superclass_cache[cls_addr] = self.class_getSuperclass(cls_addr)
+            receiver = getattr(self._super_tls, 'scratch', None)
+            if receiver is None:
+                receiver = self._super_tls.scratch = objc_super()
+            receiver.receiver = obj
+            receiver.super_class = sup
+            return self._msgsend(restype, argtypes, True)(byref(receiver), sel, *args)
+        return self._msgsend(restype, argtypes)(obj, sel, *args)
+
+    def _msgsend(self, restype: Optional[type], argtypes: tuple[type, ...], is_super: bool = False) -> Callable:
+        key = (restype, argtypes, is_super)
+        fn = self._msgsend_cache.get(key)
+        if fn is None:
+            if is_super:
+                fn = _bound(self.pobjc_msgSendSuper, restype, (POINTER(objc_super), c_void_p) + argtypes)
+            else:
+                fn = _bound(self.pobjc_msgSend, restype, (c_void_p, c_void_p) + argtypes)
+            self._msgsend_cache[key] = fn
+        return fn
+
+    def send0(self, obj, sel: int, restype: Optional[type] = None):
+        return self._msgsend(restype, ())(obj, sel)
+
+    def send_v(self, obj, sel_addr: int, *args, argtypes: tuple[type, ...] = ()) -> None:
+        self._msgsend(None, argtypes)(obj, sel_addr, *args)
+
+    def send_p(self, obj, sel_addr: int, *args, argtypes: tuple[type, ...] = ()) -> Optional[int]:
+        return self._msgsend(c_void_p, argtypes)(obj, sel_addr, *args)
+
+    def send_i(self, obj, sel_addr: int, *args, argtypes: tuple[type, ...] = ()) -> int:
+        return self._msgsend(c_long, argtypes)(obj, sel_addr, *args)
+
+    def send_b(self, obj, sel_addr: int, *args, argtypes: tuple[type, ...] = ()) -> bool:
+        return self._msgsend(c_bool, argtypes)(obj, sel_addr, *args)
+
+    def imp_for(self, cls: int, sel: int, restype: Optional[type] = None, argtypes: tuple[type, ...] = ()) -> Callable:
+        key = (cls, sel, restype, argtypes)
+        fn = self._imp_cache.get(key)
+        if fn is None:
+            imp = self.class_getMethodImplementation(cls, sel)
+            if not imp:
+                raise ValueError(f'no method implementation for selector {sel!r} on class {cls!r}')
+            fn = self._imp_cache[key] = _proto(restype, (c_void_p, c_void_p) + argtypes)(imp)
+        return fn
+
+    def selector(self, sel_name: bytes) -> int:
+        sel_addr = self._sel_cache.get(sel_name)
+        if sel_addr is None:
+            sel_addr = self._sel_cache[sel_name] = self.sel_registerName(sel_name)
+        return sel_addr
+
+    def bind_selector(self, sel_name: bytes, restype: Optional[type] = None, argtypes: tuple[type, ...] = ()) -> Callable:
+        key = (sel_name, restype, argtypes)
+        bound = self._bound_sels.get(key)
+        if bound is None:
+            sel = self.selector(sel_name)
+            fn = self._msgsend(restype, argtypes)
+            bound = self._bound_sels[key] = lambda obj, *args: fn(obj, sel, *args)
+        return bound
 
     def safe_new_object(self, cls: c_void_p, init_name: bytes = b'init', *args, argtypes: tuple[type, ...] = ()) -> NotNull_VoidP:
-        obj = c_void_p(self.send_message(cls, b'alloc', restype=c_void_p))
-        obj = c_void_p(self.send_message(obj, init_name, restype=c_void_p, *args, argtypes=argtypes))
-        return NotNull_VoidP(obj.value)
+        obj = self._alloc(cls, self._sel_alloc)
+        obj = self.send_p(obj, self.selector(init_name), *args, argtypes=argtypes)
+        return not_null(c_void_p(obj), lambda: f'create {self.class_getName(cls).decode()} instance with {init_name.decode()}')
 
     def safe_objc_getClass(self, name: bytes) -> NotNull_VoidP:
-        Cls = c_void_p(self.objc_getClass(name))
-        return NotNull_VoidP(Cls.value)
+        cls_addr = self._class_cache.get(name)
+        if cls_addr is None:
+            cls_addr = self.objc_getClass(name)
+            if cls_addr:
+                self._class_cache[name] = cls_addr
+        return not_null(c_void_p(cls_addr), lambda: f'look up class {name.decode()}')
+
+    def bulk_get_classes(self, *names: bytes) -> SimpleNamespace:
+        return SimpleNamespace(**{name.decode(): self.safe_objc_getClass(name) for name in names})
 
 
 class DoubleDouble(Structure):
@@ -233,8 +373,12 @@ class CGRect(Structure):
     )
 
 
+_ZERO_RECT = CGRect()
+
+
 with PyNeApple() as pa:
+    cls = pa.bulk_get_classes(b'WKWebView', b'WKWebViewConfiguration')
     pa.safe_new_object(
-        pa.safe_objc_getClass(b'WKWebView'), b'initWithFrame:configuration:',
-        CGRect(), pa.safe_new_object(c_void_p(pa.objc_getClass(b'WKWebViewConfiguration'))),
+        cls.WKWebView, b'initWithFrame:configuration:',
+        _ZERO_RECT, pa.safe_new_object(cls.WKWebViewConfiguration),
         argtypes=(CGRect, c_void_p))